@@ -3,12 +3,25 @@ Weather8 - Main Flask Application
 A web dashboard for weather data with current conditions and 5-day forecast.
 """
 
-from flask import Flask, render_template, request, jsonify, flash
+from flask import Flask, render_template, request, flash
 import os
+import sys
+import atexit
+import logging
+import queue
+import threading
+import time
+import unicodedata
+import gzip
+import hashlib
+import orjson
 from dotenv import load_dotenv
 from weather_client import WeatherClient, WeatherAPIError, NetworkError, CityNotFoundError, APIKeyError
-import json
+from collections import OrderedDict, namedtuple
 from datetime import datetime, timedelta
+from concurrent.futures import Future
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 
 # Load environment variables
 load_dotenv()
@@ -17,36 +30,246 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'weather8-dev-key-change-in-production')
 
+# Log through a queue so request threads only enqueue records; a single
+# listener thread does the actual console I/O
+log_queue = queue.Queue(-1)
+log_handler = logging.StreamHandler(sys.stdout)
+log_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+log_listener = QueueListener(log_queue, log_handler)
+log_listener.start()
+atexit.register(log_listener.stop)  # flush pending records on shutdown
+
+logger = logging.getLogger('weather8')
+logger.setLevel(logging.INFO)
+logger.addHandler(QueueHandler(log_queue))
+logger.propagate = False  # root handlers (gunicorn, Werkzeug) would write synchronously, and twice
+
 # Initialize WeatherClient
 try:
     weather_client = WeatherClient()
-    print("✅ WeatherClient initialized successfully")
+    logger.info("✅ WeatherClient initialized successfully")
 except Exception as e:
-    print(f"❌ Failed to initialize WeatherClient: {e}")
+    logger.error("❌ Failed to initialize WeatherClient: %s", e)
     weather_client = None
 
 # Simple in-memory cache for API results (TTL caching)
-cache = {}
+# Entries are kept in insertion order, which with a single TTL is also
+# expiry order, so eviction only ever looks at the oldest entries.
+cache = OrderedDict()
 CACHE_DURATION = timedelta(minutes=10)  # Cache for 10 minutes
+CACHE_TTL_SECONDS = CACHE_DURATION.total_seconds()
+CACHE_MAX_ENTRIES = 1024
+GZIP_LEVEL = 1  # fastest level; still most of the achievable ratio on JSON
+GZIP_ETAG_SUFFIX = '-gz'  # tells the gzip form's ETag apart from the identity form's
+
+# One cached response: encoded body, its weak ETag, the gzipped body and
+# the monotonic time it was stored
+CacheEntry = namedtuple('CacheEntry', 'body etag body_gz timestamp')
+
+# cache_lock guards the cache itself; inflight maps each cache key being
+# fetched to a Future of its result, so concurrent misses on the same city
+# make a single upstream call
+cache_lock = threading.Lock()
+inflight = {}
+inflight_lock = threading.Lock()
+
+# Pre-encoded pieces of the {'success': True, 'data': ..., 'cached': ...} envelope
+SUCCESS_PREFIX = b'{"success":true,"data":'
+CACHED_SUFFIX = b',"cached":true}'
+FRESH_SUFFIX = b',"cached":false}'
+
+# Pre-encoded bodies for the fixed-message error responses
+ERR_NO_CITY = orjson.dumps({'success': False, 'error': 'City parameter is required'})
+ERR_SERVICE_UNAVAILABLE = orjson.dumps({'success': False, 'error': 'Weather service is not available'})
+ERR_AUTH = orjson.dumps({'success': False, 'error': 'Weather service authentication error. Please try again later.'})
+ERR_NETWORK = orjson.dumps({'success': False, 'error': 'Unable to connect to weather service. Please check your internet connection.'})
+ERR_UNEXPECTED = orjson.dumps({'success': False, 'error': 'An unexpected error occurred. Please try again.'})
 
 
 def is_cache_valid(timestamp):
     """Check if cached data is still valid (within TTL)"""
-    return datetime.now() - timestamp < CACHE_DURATION
+    return time.monotonic() - timestamp < CACHE_TTL_SECONDS
+
+
+@lru_cache(maxsize=4096)
+def canonical_city(city):
+    """Normalize a city name so case/Unicode variants share one cache entry"""
+    return unicodedata.normalize('NFKC', city).strip().casefold()
+
+
+def evict_cache_entries():
+    """Drop expired entries and trim the cache to CACHE_MAX_ENTRIES, oldest first (caller holds cache_lock)"""
+    cutoff = time.monotonic() - CACHE_TTL_SECONDS
+    while cache:
+        if next(iter(cache.values())).timestamp > cutoff and len(cache) <= CACHE_MAX_ENTRIES:
+            break
+        cache.popitem(last=False)
 
 
 def get_cached_data(cache_key):
-    """Get data from cache if valid, None otherwise"""
-    if cache_key in cache:
-        data, timestamp = cache[cache_key]
-        if is_cache_valid(timestamp):
-            return data
+    """Get the CacheEntry for cache_key from cache if valid, None otherwise"""
+    with cache_lock:
+        if cache_key in cache:
+            entry = cache[cache_key]
+            if is_cache_valid(entry.timestamp):
+                return entry
+            del cache[cache_key]
     return None
 
 
 def set_cache_data(cache_key, data):
-    """Store data in cache with current timestamp"""
-    cache[cache_key] = (data, datetime.now())
+    """
+    Store data in cache with current (monotonic) timestamp
+
+    The payload is encoded once and spliced into both response envelopes:
+    the cache-hit body is stored, the fresh (uncached) body is returned
+    for the current request. Both share a weak ETag derived from the
+    payload, since they differ only in the 'cached' flag. The cache-hit
+    body is also gzipped once here for clients that accept it.
+    """
+    encoded = orjson.dumps(data)
+    etag = hashlib.blake2b(encoded, digest_size=8).hexdigest()
+    body = SUCCESS_PREFIX + encoded + CACHED_SUFFIX
+    body_gz = gzip.compress(body, GZIP_LEVEL)
+    with cache_lock:
+        cache[cache_key] = CacheEntry(body, etag, body_gz, time.monotonic())
+        cache.move_to_end(cache_key)
+        evict_cache_entries()
+    return SUCCESS_PREFIX + encoded + FRESH_SUFFIX, etag
+
+
+def single_flight(cache_key, fetch):
+    """
+    Run fetch() for cache_key, sharing one call among concurrent callers
+
+    The first caller runs fetch(); callers arriving while it is in flight
+    wait for it and get the same result, or have the same exception raised,
+    instead of each repeating the upstream call.
+    """
+    with inflight_lock:
+        future = inflight.get(cache_key)
+        is_leader = future is None
+        if is_leader:
+            future = inflight[cache_key] = Future()
+    if not is_leader:
+        return future.result()
+
+    try:
+        result = fetch()
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with inflight_lock:
+            del inflight[cache_key]
+
+
+def json_response(body, status=200):
+    """Wrap already-encoded JSON bytes in a response"""
+    return app.response_class(body, status=status, mimetype='application/json')
+
+
+def etag_response(body, etag, body_gz=None):
+    """
+    Wrap JSON bytes in a response tagged with a weak ETag, or 304 if the client has it
+
+    Clients that accept gzip get body_gz (compressed here if not supplied),
+    tagged etag + GZIP_ETAG_SUFFIX so caches that ignore Vary do not mix
+    it up with the identity form. Either tag counts as a match.
+    """
+    accepts_gzip = request.accept_encodings['gzip']
+    gzip_etag = etag + GZIP_ETAG_SUFFIX
+    if request.if_none_match.contains_weak(etag) or request.if_none_match.contains_weak(gzip_etag):
+        response = app.response_class(status=304)
+    elif accepts_gzip:
+        response = json_response(body_gz or gzip.compress(body, GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = json_response(body)
+    response.set_etag(gzip_etag if accepts_gzip else etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def ojsonify(payload, status=200):
+    """Serialize payload with orjson and wrap it in a JSON response"""
+    return json_response(orjson.dumps(payload), status)
+
+
+def fetch_current_weather(city, cache_key):
+    """Fetch current weather for city, extract the dashboard fields and cache them"""
+    # Fetch current weather data
+    weather_data = weather_client.get_current_weather(city)
+
+    # Extract relevant information
+    current = weather_data.get('current', {})
+    location = weather_data.get('location', {})
+    condition = current.get('condition', {})
+
+    result = {
+        'location': {
+            'name': location.get('name', 'Unknown'),
+            'country': location.get('country', ''),
+            'region': location.get('region', ''),
+            'local_time': location.get('localtime', '')
+        },
+        'current': {
+            'temperature_c': current.get('temp_c', 0),
+            'temperature_f': current.get('temp_f', 0),
+            'condition': condition.get('text', 'Unknown'),
+            'icon': condition.get('icon', ''),
+            'humidity': current.get('humidity', 0),
+            'wind_kph': current.get('wind_kph', 0),
+            'wind_dir': current.get('wind_dir', ''),
+            'feels_like_c': current.get('feelslike_c', 0),
+            'uv': current.get('uv', 0),
+            'visibility_km': current.get('vis_km', 0)
+        },
+        'last_updated': current.get('last_updated', '')
+    }
+
+    # Cache the result
+    return set_cache_data(cache_key, result)
+
+
+def fetch_forecast(city, cache_key):
+    """Fetch the 5-day forecast for city, extract the dashboard fields and cache them"""
+    # Fetch 5-day forecast data
+    forecast_data = weather_client.get_forecast(city, days=5)
+
+    # Extract relevant information
+    location = forecast_data.get('location', {})
+    forecast_days = forecast_data.get('forecast', {}).get('forecastday', [])
+
+    result = {
+        'location': {
+            'name': location.get('name', 'Unknown'),
+            'country': location.get('country', ''),
+            'region': location.get('region', '')
+        },
+        'forecast': []
+    }
+
+    # Process each forecast day
+    for day_data in forecast_days:
+        day = day_data.get('day', {})
+        condition = day.get('condition', {})
+        result['forecast'].append({
+            'date': day_data.get('date', ''),
+            'max_temp_c': day.get('maxtemp_c', 0),
+            'min_temp_c': day.get('mintemp_c', 0),
+            'max_temp_f': day.get('maxtemp_f', 0),
+            'min_temp_f': day.get('mintemp_f', 0),
+            'condition': condition.get('text', 'Unknown'),
+            'icon': condition.get('icon', ''),
+            'chance_of_rain': day.get('daily_chance_of_rain', 0),
+            'avg_humidity': day.get('avghumidity', 0)
+        })
+
+    # Cache the result
+    return set_cache_data(cache_key, result)
 
 
 @app.route('/')
@@ -64,97 +287,45 @@ def get_current_weather():
     city = request.args.get('city', '').strip()
     
     if not city:
-        return jsonify({
-            'success': False,
-            'error': 'City parameter is required'
-        }), 400
+        return json_response(ERR_NO_CITY, 400)
     
     if not weather_client:
-        return jsonify({
-            'success': False,
-            'error': 'Weather service is not available'
-        }), 500
+        return json_response(ERR_SERVICE_UNAVAILABLE, 500)
     
     # Check cache first
-    cache_key = f"current_{city.lower()}"
-    cached_data = get_cached_data(cache_key)
+    cache_key = ('current', canonical_city(city))
+    cached = get_cached_data(cache_key)
     
-    if cached_data:
-        return jsonify({
-            'success': True,
-            'data': cached_data,
-            'cached': True
-        })
+    if cached:
+        return etag_response(cached.body, cached.etag, cached.body_gz)
     
     try:
-        # Fetch current weather data
-        weather_data = weather_client.get_current_weather(city)
-        
-        # Extract relevant information
-        current = weather_data.get('current', {})
-        location = weather_data.get('location', {})
-        
-        result = {
-            'location': {
-                'name': location.get('name', 'Unknown'),
-                'country': location.get('country', ''),
-                'region': location.get('region', ''),
-                'local_time': location.get('localtime', '')
-            },
-            'current': {
-                'temperature_c': current.get('temp_c', 0),
-                'temperature_f': current.get('temp_f', 0),
-                'condition': current.get('condition', {}).get('text', 'Unknown'),
-                'icon': current.get('condition', {}).get('icon', ''),
-                'humidity': current.get('humidity', 0),
-                'wind_kph': current.get('wind_kph', 0),
-                'wind_dir': current.get('wind_dir', ''),
-                'feels_like_c': current.get('feelslike_c', 0),
-                'uv': current.get('uv', 0),
-                'visibility_km': current.get('vis_km', 0)
-            },
-            'last_updated': current.get('last_updated', '')
-        }
-        
-        # Cache the result
-        set_cache_data(cache_key, result)
-        
-        return jsonify({
-            'success': True,
-            'data': result,
-            'cached': False
-        })
+        # Concurrent misses for this city share one upstream call and its outcome
+        body, etag = single_flight(cache_key, lambda: fetch_current_weather(city, cache_key))
         
+        return etag_response(body, etag)
+    
     except CityNotFoundError:
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': f"City '{city}' not found. Please check the spelling and try again."
-        }), 404
-        
+        }, 404)
+    
     except APIKeyError as e:
-        return jsonify({
-            'success': False,
-            'error': 'Weather service authentication error. Please try again later.'
-        }), 401
-        
+        return json_response(ERR_AUTH, 401)
+    
     except NetworkError as e:
-        return jsonify({
-            'success': False,
-            'error': 'Unable to connect to weather service. Please check your internet connection.'
-        }), 503
-        
+        return json_response(ERR_NETWORK, 503)
+    
     except WeatherAPIError as e:
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': f'Weather service error: {str(e)}'
-        }), 500
-        
+        }, 500)
+    
     except Exception as e:
-        print(f"Unexpected error in get_current_weather: {e}")
-        return jsonify({
-            'success': False,
-            'error': 'An unexpected error occurred. Please try again.'
-        }), 500
+        logger.error("Unexpected error in get_current_weather: %s", e)
+        return json_response(ERR_UNEXPECTED, 500)
 
 
 @app.route('/api/weather/forecast')
@@ -166,114 +337,65 @@ def get_forecast():
     city = request.args.get('city', '').strip()
     
     if not city:
-        return jsonify({
-            'success': False,
-            'error': 'City parameter is required'
-        }), 400
+        return json_response(ERR_NO_CITY, 400)
     
     if not weather_client:
-        return jsonify({
-            'success': False,
-            'error': 'Weather service is not available'
-        }), 500
+        return json_response(ERR_SERVICE_UNAVAILABLE, 500)
     
     # Check cache first
-    cache_key = f"forecast_{city.lower()}"
-    cached_data = get_cached_data(cache_key)
+    cache_key = ('forecast', canonical_city(city))
+    cached = get_cached_data(cache_key)
     
-    if cached_data:
-        return jsonify({
-            'success': True,
-            'data': cached_data,
-            'cached': True
-        })
+    if cached:
+        return etag_response(cached.body, cached.etag, cached.body_gz)
     
     try:
-        # Fetch 5-day forecast data
-        forecast_data = weather_client.get_forecast(city, days=5)
-        
-        # Extract relevant information
-        location = forecast_data.get('location', {})
-        forecast_days = forecast_data.get('forecast', {}).get('forecastday', [])
-        
-        result = {
-            'location': {
-                'name': location.get('name', 'Unknown'),
-                'country': location.get('country', ''),
-                'region': location.get('region', '')
-            },
-            'forecast': []
-        }
-        
-        # Process each forecast day
-        for day_data in forecast_days:
-            day = day_data.get('day', {})
-            result['forecast'].append({
-                'date': day_data.get('date', ''),
-                'max_temp_c': day.get('maxtemp_c', 0),
-                'min_temp_c': day.get('mintemp_c', 0),
-                'max_temp_f': day.get('maxtemp_f', 0),
-                'min_temp_f': day.get('mintemp_f', 0),
-                'condition': day.get('condition', {}).get('text', 'Unknown'),
-                'icon': day.get('condition', {}).get('icon', ''),
-                'chance_of_rain': day.get('daily_chance_of_rain', 0),
-                'avg_humidity': day.get('avghumidity', 0)
-            })
-        
-        # Cache the result
-        set_cache_data(cache_key, result)
-        
-        return jsonify({
-            'success': True,
-            'data': result,
-            'cached': False
-        })
+        # Concurrent misses for this city share one upstream call and its outcome
+        body, etag = single_flight(cache_key, lambda: fetch_forecast(city, cache_key))
         
+        return etag_response(body, etag)
+    
     except CityNotFoundError:
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': f"City '{city}' not found. Please check the spelling and try again."
-        }), 404
-        
+        }, 404)
+    
     except APIKeyError as e:
-        return jsonify({
-            'success': False,
-            'error': 'Weather service authentication error. Please try again later.'
-        }), 401
-        
+        return json_response(ERR_AUTH, 401)
+    
     except NetworkError as e:
-        return jsonify({
-            'success': False,
-            'error': 'Unable to connect to weather service. Please check your internet connection.'
-        }), 503
-        
+        return json_response(ERR_NETWORK, 503)
+    
     except WeatherAPIError as e:
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': f'Weather service error: {str(e)}'
-        }), 500
-        
+        }, 500)
+    
     except Exception as e:
-        print(f"Unexpected error in get_forecast: {e}")
-        return jsonify({
-            'success': False,
-            'error': 'An unexpected error occurred. Please try again.'
-        }), 500
+        logger.error("Unexpected error in get_forecast: %s", e)
+        return json_response(ERR_UNEXPECTED, 500)
 
 
 @app.route('/api/cache/status')
 def cache_status():
     """Debug endpoint to check cache status"""
     cache_info = {}
-    for key, (data, timestamp) in cache.items():
-        cache_info[key] = {
-            'timestamp': timestamp.isoformat(),
-            'valid': is_cache_valid(timestamp),
-            'age_minutes': (datetime.now() - timestamp).total_seconds() / 60
+    now = time.monotonic()
+    wall_now = datetime.now()
+    with cache_lock:
+        entries = list(cache.items())
+    for (kind, city), entry in entries:
+        age_seconds = now - entry.timestamp
+        cache_info[f"{kind}_{city}"] = {
+            'timestamp': wall_now - timedelta(seconds=age_seconds),
+            'valid': age_seconds < CACHE_TTL_SECONDS,
+            'age_minutes': age_seconds / 60
         }
     
-    return jsonify({
-        'cache_entries': len(cache),
+    return ojsonify({
+        'cache_entries': len(entries),
         'cache_details': cache_info,
         'cache_duration_minutes': CACHE_DURATION.total_seconds() / 60
     })
@@ -294,15 +416,16 @@ def internal_error(error):
 if __name__ == '__main__':
     # Check if WeatherClient is working
     if weather_client and weather_client.test_connection():
-        print("🌤️  Weather8 is ready!")
-        print("🔗 WeatherAPI connection: ✅ Working")
+        logger.info("🌤️  Weather8 is ready!")
+        logger.info("🔗 WeatherAPI connection: ✅ Working")
     else:
-        print("⚠️  Warning: WeatherAPI connection issues detected")
+        logger.warning("⚠️  Warning: WeatherAPI connection issues detected")
     
-    # Run Flask app
+    # Run Flask development server for local use only; production runs
+    # under gunicorn (`gunicorn app:app`, see gunicorn.conf.py)
     # host='0.0.0.0' makes it accessible via IP address (192.168.x.x)
     app.run(
         host='0.0.0.0',  # Accessible from network
         port=5000,
-        debug=True
+        debug=os.getenv('FLASK_DEBUG') == '1'  # Reloader/debugger only when asked for
     )
\ No newline at end of file
@@ -0,0 +1,17 @@
+"""
+Weather8 - Gunicorn Configuration
+Production server settings, picked up automatically by `gunicorn app:app`.
+"""
+
+import os
+
+# Listen on the same address as the development server
+bind = os.getenv('WEATHER8_BIND', '0.0.0.0:5000')
+
+# gevent workers patch sockets cooperatively, so a worker blocked on a
+# WeatherAPI call keeps serving other requests while it waits.
+# WEATHER8_WORKER_CLASS=gthread switches to plain OS threads instead.
+worker_class = os.getenv('WEATHER8_WORKER_CLASS', 'gevent')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_connections = 1000  # gevent: concurrent connections per worker
+threads = 32  # gthread: request threads per worker
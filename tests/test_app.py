@@ -0,0 +1,123 @@
+"""
+Tests for the Flask app's response cache and request coalescing
+"""
+
+import threading
+import time
+
+import pytest
+
+import app as weather_app
+from weather_client import NetworkError
+
+
+UPSTREAM_DELAY = 0.3
+CONCURRENT_REQUESTS = 6
+
+
+class FakeWeatherClient:
+    """Stands in for WeatherClient; each call takes UPSTREAM_DELAY seconds"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_current_weather(self, city):
+        with self._lock:
+            self.calls += 1
+        time.sleep(UPSTREAM_DELAY)
+        if self.error:
+            raise self.error
+        return {
+            'location': {'name': city.title(), 'country': 'UK'},
+            'current': {'temp_c': 11.0, 'condition': {'text': 'Cloudy'}}
+        }
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    weather_app.cache.clear()
+    yield
+    weather_app.cache.clear()
+
+
+def fetch_concurrently(url):
+    """GET url from CONCURRENT_REQUESTS threads at once; return (responses, elapsed seconds)"""
+    barrier = threading.Barrier(CONCURRENT_REQUESTS)
+    responses = [None] * CONCURRENT_REQUESTS
+
+    def worker(i):
+        client = weather_app.app.test_client()
+        barrier.wait()
+        responses[i] = client.get(url)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(CONCURRENT_REQUESTS)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses, time.monotonic() - start
+
+
+def test_concurrent_misses_share_one_upstream_call(monkeypatch):
+    fake = FakeWeatherClient()
+    monkeypatch.setattr(weather_app, 'weather_client', fake)
+
+    responses, elapsed = fetch_concurrently('/api/weather/current?city=London')
+
+    assert fake.calls == 1
+    assert [r.status_code for r in responses] == [200] * CONCURRENT_REQUESTS
+    assert all(r.get_json()['data']['location']['name'] == 'London' for r in responses)
+    assert elapsed < 2 * UPSTREAM_DELAY
+
+
+def test_concurrent_misses_share_one_upstream_failure(monkeypatch):
+    fake = FakeWeatherClient(error=NetworkError("Request timed out"))
+    monkeypatch.setattr(weather_app, 'weather_client', fake)
+
+    responses, elapsed = fetch_concurrently('/api/weather/current?city=London')
+
+    # Waiters get the first caller's error instead of retrying upstream in turn
+    assert fake.calls == 1
+    assert [r.status_code for r in responses] == [503] * CONCURRENT_REQUESTS
+    assert elapsed < 2 * UPSTREAM_DELAY
+    assert weather_app.inflight == {}
+
+
+def test_cache_hit_after_fetch(monkeypatch):
+    fake = FakeWeatherClient()
+    monkeypatch.setattr(weather_app, 'weather_client', fake)
+    client = weather_app.app.test_client()
+
+    first = client.get('/api/weather/current?city=London')
+    second = client.get('/api/weather/current?city=LONDON ')
+
+    assert fake.calls == 1
+    assert first.get_json()['cached'] is False
+    assert second.get_json()['cached'] is True
+    assert first.headers['ETag'] == second.headers['ETag']
+
+
+def test_logger_only_writes_through_the_queue():
+    assert weather_app.logger.propagate is False
+    assert any(isinstance(h, weather_app.QueueHandler) for h in weather_app.logger.handlers)
+
+
+def test_gzip_response_has_its_own_etag(monkeypatch):
+    monkeypatch.setattr(weather_app, 'weather_client', FakeWeatherClient())
+    client = weather_app.app.test_client()
+
+    plain = client.get('/api/weather/current?city=London')
+    gzipped = client.get('/api/weather/current?city=London', headers={'Accept-Encoding': 'gzip'})
+
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzipped.headers['ETag'] == plain.headers['ETag'][:-1] + weather_app.GZIP_ETAG_SUFFIX + '"'
+
+    # Either form of the tag revalidates either form of the response
+    for etag in (plain.headers['ETag'], gzipped.headers['ETag']):
+        for encoding in ('identity', 'gzip'):
+            response = client.get('/api/weather/current?city=London',
+                                  headers={'If-None-Match': etag, 'Accept-Encoding': encoding})
+            assert response.status_code == 304
@@ -0,0 +1,189 @@
+"""
+Tests for WeatherClient's retry policy and response cache
+"""
+
+import email.utils
+import time
+
+import orjson
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from weather_client import CityNotFoundError, WeatherClient
+
+
+LONDON = {'location': {'name': 'London'}, 'current': {'temp_c': 11.0}}
+
+
+def make_response(status=200, payload=None, headers=None):
+    """Build a requests.Response with the given status, JSON payload and headers"""
+    response = requests.Response()
+    response.status_code = status
+    response._content = orjson.dumps(payload) if payload is not None else b''
+    response.headers = CaseInsensitiveDict(headers or {})
+    return response
+
+
+class StubSession:
+    """Stands in for requests.Session, replying with queued responses and recording each request"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.requests.append(headers or {})
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def client():
+    def build(*responses):
+        return WeatherClient(api_key='test-key', session=StubSession(*responses))
+    return build
+
+
+def test_rate_limited_requests_are_not_retried():
+    retry = WeatherClient(api_key='test-key').session.get_adapter('https://').max_retries
+
+    assert not retry.is_retry('GET', 429, has_retry_after=True)
+    assert not retry.is_retry('GET', 429, has_retry_after=False)
+    assert retry.is_retry('GET', 503)
+
+
+def test_callers_get_their_own_copy_of_cached_data(client):
+    weather = client(make_response(payload=LONDON))
+
+    first = weather.get_current_weather('London')
+    first['location']['name'] = 'Changed'
+    second = weather.get_current_weather('London')
+
+    assert second['location']['name'] == 'London'
+    assert len(weather.session.requests) == 1
+
+
+def expire_cache(weather):
+    """Mark every cached entry as past its TTL, keeping its validators"""
+    for key, (content, _, etag, last_modified) in list(weather._cache.items()):
+        weather._cache[key] = (content, 0.0, etag, last_modified)
+
+
+def test_fresh_entry_is_served_from_cache(client):
+    weather = client(make_response(payload=LONDON))
+
+    assert weather.get_current_weather('London') == LONDON
+    assert weather.get_current_weather('London') == LONDON
+    assert len(weather.session.requests) == 1
+
+
+def test_cache_clear_forces_refetch(client):
+    weather = client(make_response(payload=LONDON), make_response(payload=LONDON))
+
+    weather.get_current_weather('London')
+    weather.cache_clear()
+    weather.get_current_weather('London')
+
+    assert len(weather.session.requests) == 2
+
+
+def test_stale_entry_with_etag_is_revalidated(client):
+    weather = client(
+        make_response(payload=LONDON, headers={'ETag': '"v1"', 'Cache-Control': 'max-age=60'}),
+        make_response(status=304, headers={'Cache-Control': 'max-age=60'})
+    )
+
+    weather.get_current_weather('London')
+    expire_cache(weather)
+
+    assert weather.get_current_weather('London') == LONDON
+    assert weather.session.requests[1] == {'If-None-Match': '"v1"'}
+
+    # The 304 restarted the entry's TTL, so this is a plain cache hit
+    assert weather.get_current_weather('London') == LONDON
+    assert len(weather.session.requests) == 2
+
+
+def test_stale_entry_with_last_modified_is_revalidated(client):
+    last_modified = 'Wed, 14 Oct 2026 09:00:00 GMT'
+    weather = client(
+        make_response(payload=LONDON, headers={'Last-Modified': last_modified}),
+        make_response(status=304)
+    )
+
+    weather.get_current_weather('London')
+    expire_cache(weather)
+
+    assert weather.get_current_weather('London') == LONDON
+    assert weather.session.requests[1] == {'If-Modified-Since': last_modified}
+
+
+def test_stale_entry_without_validator_is_dropped(client):
+    updated = {'location': {'name': 'London'}, 'current': {'temp_c': 12.5}}
+    weather = client(make_response(payload=LONDON), make_response(payload=updated))
+
+    weather.get_current_weather('London')
+    expire_cache(weather)
+
+    assert weather._cache_get(('current.json', (('aqi', 'no'), ('q', 'London')))) is None
+    assert weather.get_current_weather('London') == updated
+    assert weather.session.requests[1] == {}
+
+
+def test_no_store_response_is_not_cached(client):
+    weather = client(
+        make_response(payload=LONDON, headers={'Cache-Control': 'no-store', 'ETag': '"v1"'}),
+        make_response(payload=LONDON)
+    )
+
+    weather.get_current_weather('London')
+    weather.get_current_weather('London')
+
+    assert len(weather.session.requests) == 2
+    assert weather.session.requests[1] == {}
+
+
+def test_no_cache_response_is_revalidated_on_next_use(client):
+    weather = client(
+        make_response(payload=LONDON, headers={'Cache-Control': 'no-cache', 'ETag': '"v1"'}),
+        make_response(status=304, headers={'Cache-Control': 'no-cache'})
+    )
+
+    weather.get_current_weather('London')
+
+    assert weather.get_current_weather('London') == LONDON
+    assert weather.session.requests[1] == {'If-None-Match': '"v1"'}
+
+
+@pytest.mark.parametrize('headers, expected', [
+    ({'Cache-Control': 'public, max-age=120'}, 120),
+    ({'Cache-Control': 'no-cache, max-age=120'}, 0),
+    ({'Cache-Control': 'max-age=120', 'Expires': 'Thu, 01 Jan 1970 00:00:00 GMT'}, 120),
+    ({'Expires': 'not a date'}, 300),
+    ({}, 300)
+])
+def test_response_ttl(headers, expected):
+    weather = WeatherClient(api_key='test-key', session=StubSession())
+
+    assert weather._response_ttl('current.json', make_response(headers=headers)) == expected
+
+
+def test_response_ttl_from_expires():
+    weather = WeatherClient(api_key='test-key', session=StubSession())
+    expires = email.utils.formatdate(time.time() + 60, usegmt=True)
+
+    ttl = weather._response_ttl('current.json', make_response(headers={'Expires': expires}))
+
+    assert 55 <= ttl <= 60
+
+
+@pytest.mark.parametrize('concurrency', [0, -3])
+def test_fan_out_clamps_concurrency(client, concurrency):
+    weather = client(make_response(payload=LONDON), make_response(status=400, payload={
+        'error': {'code': 1006, 'message': 'No matching location found.'}
+    }))
+
+    london, missing = weather.get_many_current(['London', 'Nowhere'], concurrency=concurrency)
+
+    assert london == LONDON
+    assert isinstance(missing, CityNotFoundError)
@@ -4,11 +4,29 @@ Handles API communication with WeatherAPI.com
 """
 
 import requests
+import orjson
+from requests.adapters import HTTPAdapter
+from requests.exceptions import (ConnectionError as _ReqConnError, Timeout as _ReqTimeout,
+                                 RequestException as _ReqException)
+from urllib3.util.retry import Retry
 import os
-from typing import Dict, Any, Optional
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlencode
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
 from datetime import datetime
 
 
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+# Bound once at import so the request path does a single global lookup
+_orjson_loads = orjson.loads
+
+
 class WeatherAPIError(Exception):
     """Base exception for weather API errors"""
     pass
@@ -29,30 +47,235 @@ class CityNotFoundError(WeatherAPIError):
     pass
 
 
+# WeatherAPI error codes (error.code in the JSON body) that map to a more
+# specific exception than WeatherAPIError
+_ERROR_CODE_EXCEPTIONS = {
+    1002: APIKeyError,        # API key not provided
+    1006: CityNotFoundError,  # No location found matching parameter 'q'
+    2006: APIKeyError,        # API key provided is invalid
+    2007: APIKeyError,        # API key has exceeded calls per month quota
+    2008: APIKeyError,        # API key has been disabled
+    2009: APIKeyError         # API key has no access to the resource
+}
+
+
+def _bad_request_error(response: requests.Response) -> WeatherAPIError:
+    """Build the exception for a 400 response from its error body"""
+    error = _orjson_loads(response.content).get('error') or {}
+    error_msg = error.get('message', 'Bad request')
+    error_class = _ERROR_CODE_EXCEPTIONS.get(error.get('code'))
+    if error_class:
+        return error_class(error_msg)
+    return WeatherAPIError(f"Bad request: {error_msg}")
+
+
+# Exception factories for non-200 responses, keyed by HTTP status code
+_STATUS_ERRORS = {
+    400: _bad_request_error,
+    401: lambda response: APIKeyError("Invalid API key"),
+    403: lambda response: APIKeyError("API key quota exceeded or access denied"),
+    429: lambda response: WeatherAPIError("Rate limit exceeded. Please try again later.")
+}
+
+
 class WeatherClient:
     """Client for interacting with WeatherAPI.com"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    # Seconds to cache successful responses per endpoint, unless the
+    # upstream Cache-Control/Expires headers say otherwise
+    CACHE_TTLS = {
+        'current.json': 300,
+        'forecast.json': 1800,
+        'search.json': 86400
+    }
+    CACHE_MAX_ENTRIES = 1024
+    
+    # Keep-alive connections kept per host; batch lookups never run more
+    # requests at once than this, so each one reuses a warm connection
+    POOL_MAXSIZE = 32
+    
+    # Fixed part of every forecast query, copied per call
+    _FORECAST_BASE_PARAMS = {
+        'aqi': 'no',
+        'alerts': 'no'  # Don't include weather alerts
+    }
+    
+    def __init__(self, api_key: Optional[str] = None, session: Optional[requests.Session] = None):
         """
         Initialize WeatherClient
         
         Args:
             api_key: WeatherAPI.com API key. If not provided, will try to get from environment
+            session: requests.Session to send requests through. Passing one
+                session to several clients (e.g. other_client.session) makes
+                them share one connection pool. If not provided, a session is
+                built on first use.
         """
         self.api_key = api_key or os.getenv('WEATHER_API_KEY')
         if not self.api_key:
             raise APIKeyError("WeatherAPI key not found. Please set WEATHER_API_KEY environment variable.")
         
-        self.base_url = "http://api.weatherapi.com/v1"
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.base_url = "https://api.weatherapi.com/v1"
+        self._urls = {
+            endpoint: f"{self.base_url}/{endpoint}"
+            for endpoint in ('current.json', 'forecast.json', 'search.json')
+        }
+        self._session = session
+        self._session_lock = threading.Lock()
+        
+        # Fully encoded request URLs for frequent queries, keyed like the
+        # response cache (see prepare_query)
+        self._prebuilt = {}
+        self._ping_query = self.prepare_query('current.json', q='London', aqi='no')
+        
+        # Response cache:
+        # (endpoint, sorted params) -> (content, expires_at, etag, last_modified)
+        # Raw response bytes are kept rather than the decoded dict, so every
+        # caller decodes its own copy and nothing handed out is shared
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
+        # Requests currently on the wire: cache key -> Future of the response content
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+    
+    def prepare_query(self, endpoint: str, **params: Any) -> Tuple:
+        """
+        Pre-encode the URL for a query that will be sent repeatedly
+        
+        Later requests with exactly these params (e.g. polling one city)
+        use the stored URL instead of re-encoding the query every time.
+        
+        Args:
+            endpoint: API endpoint
+            **params: Query parameters, without the API key
+            
+        Returns:
+            Key identifying the prepared query
+        """
+        key = (endpoint, tuple(sorted(params.items())))
+        query = urlencode(list(key[1]) + [('key', self.api_key)])
+        self._prebuilt[key] = f"{self._urls[endpoint]}?{query}"
+        return key
+    
+    @property
+    def session(self) -> requests.Session:
+        """HTTP session, built on first use unless one was passed in"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._build_session()
+        return self._session
+    
+    @staticmethod
+    def _build_session() -> requests.Session:
+        """Build a session with a sized keep-alive pool and retries for transient errors"""
+        session = requests.Session()
+        session.headers.update({
             'User-Agent': 'Weather8/1.0'
         })
+        
+        # Keep a larger pool of warm keep-alive connections than the default
+        # 10, and retry transient failures. 429 is not retried: while rate
+        # limited, it goes straight to the "Rate limit exceeded" error rather
+        # than spending more quota. raise_on_status=False hands the last
+        # response back so the status handling below still applies.
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=WeatherClient.POOL_MAXSIZE,
+            pool_block=False,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=(500, 502, 503, 504),
+                allowed_methods=frozenset(['GET', 'HEAD']),
+                respect_retry_after_header=False,
+                raise_on_status=False
+            )
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
+    def cache_clear(self) -> None:
+        """Drop all cached responses"""
+        with self._cache_lock:
+            self._cache.clear()
+    
+    def _cache_get(self, key: Tuple) -> Optional[Tuple[bytes, float, Optional[str], Optional[str]]]:
+        """
+        Return the cache entry (content, expires_at, etag, last_modified) for key, None otherwise
+        
+        Expired entries are kept while they carry an ETag or Last-Modified
+        validator, so the next request can revalidate them cheaply.
+        """
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            _, expires_at, etag, last_modified = entry
+            if time.monotonic() >= expires_at and not (etag or last_modified):
+                del self._cache[key]
+                return None
+            return entry
+    
+    def _cache_set(self, key: Tuple, endpoint: str, response: requests.Response, content: bytes,
+                   etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """
+        Cache a response's content, evicting the oldest entries past CACHE_MAX_ENTRIES
+        
+        The response's validators replace etag/last_modified when present.
+        """
+        if 'no-store' in response.headers.get('Cache-Control', ''):
+            return
+        ttl = self._response_ttl(endpoint, response)
+        etag = response.headers.get('ETag', etag)
+        last_modified = response.headers.get('Last-Modified', last_modified)
+        if ttl <= 0 and not (etag or last_modified):
+            return
+        with self._cache_lock:
+            self._cache[key] = (content, time.monotonic() + ttl, etag, last_modified)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+    
+    def _response_ttl(self, endpoint: str, response: requests.Response) -> float:
+        """
+        Work out how long a response may be cached
+        
+        Upstream Cache-Control max-age (or no-cache) wins, then Expires,
+        then the per-endpoint default from CACHE_TTLS.
+        """
+        cache_control = response.headers.get('Cache-Control', '')
+        if 'no-cache' in cache_control:
+            return 0
+        match = _MAX_AGE_RE.search(cache_control)
+        if match:
+            return float(match.group(1))
+        expires = response.headers.get('Expires')
+        if expires:
+            try:
+                return parsedate_to_datetime(expires).timestamp() - time.time()
+            except (TypeError, ValueError):
+                pass
+        return self.CACHE_TTLS.get(endpoint, 0)
     
     def _make_request(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """
         Make a request to the WeatherAPI
         
+        Successful responses are cached per endpoint and query (see
+        CACHE_TTLS), so repeated lookups skip the network entirely. Once an
+        entry expires it is revalidated with If-None-Match/If-Modified-Since;
+        a 304 reply reuses the cached content without transferring the body.
+        Concurrent identical requests share a single HTTP call.
+        
+        Every call returns a freshly decoded dict, so callers may modify
+        their result without affecting cached data or other callers. The
+        trade-off is that cache hits and 304 replies still run orjson.loads
+        on the cached bytes rather than skipping the parse; that is cheaper
+        than a deep copy, and far cheaper than the request it replaces.
+        
         Args:
             endpoint: API endpoint
             params: Query parameters
@@ -65,41 +288,90 @@ class WeatherClient:
             APIKeyError: If API key is invalid
             WeatherAPIError: For other API errors
         """
-        params['key'] = self.api_key
+        cache_key = (endpoint, tuple(sorted(params.items())))
+        entry = self._cache_get(cache_key)
+        if entry is not None and time.monotonic() < entry[1]:
+            return _orjson_loads(entry[0])
+        
+        # Single-flight: concurrent callers for the same query wait for the
+        # first caller's request instead of each sending their own
+        with self._inflight_lock:
+            future = self._inflight.get(cache_key)
+            is_leader = future is None
+            if is_leader:
+                future = self._inflight[cache_key] = Future()
+        if not is_leader:
+            return _orjson_loads(future.result())
         
         try:
-            response = self.session.get(
-                f"{self.base_url}/{endpoint}",
-                params=params,
-                timeout=10
-            )
+            data, content = self._fetch(endpoint, params, cache_key, entry)
+            future.set_result(content)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[cache_key]
+    
+    def _fetch(self, endpoint: str, params: Dict[str, Any], cache_key: Tuple,
+               entry: Optional[Tuple[bytes, float, Optional[str], Optional[str]]]) -> Tuple[Dict[str, Any], bytes]:
+        """
+        Send the HTTP request for _make_request and cache the result
+        
+        Returns the decoded data and the raw content it was decoded from.
+        If a stale cache entry is given, the request is made conditional on
+        its validators and a 304 reply returns the entry's content.
+        """
+        headers = {}
+        if entry is not None:
+            cached_content, _, etag, last_modified = entry
+            # Stale: ask upstream whether our copy is still current
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        
+        try:
+            prebuilt_url = self._prebuilt.get(cache_key)
+            if prebuilt_url:
+                response = self.session.get(prebuilt_url, headers=headers, timeout=10)
+            else:
+                # The key goes on a copy: the session may be shared by clients
+                # with different keys, and callers' dicts are left untouched
+                response = self.session.get(
+                    self._urls[endpoint],
+                    params={**params, 'key': self.api_key},
+                    headers=headers,
+                    timeout=10
+                )
+            
+            # Success is by far the common case; check it first
+            status = response.status_code
+            if status == 200:
+                content = response.content
+                data = _orjson_loads(content)
+                self._cache_set(cache_key, endpoint, response, content)
+                return data, content
             
-            # Handle different HTTP status codes
-            if response.status_code == 401:
-                raise APIKeyError("Invalid API key")
-            elif response.status_code == 400:
-                error_data = response.json()
-                error_msg = error_data.get('error', {}).get('message', 'Bad request')
-                if 'No matching location found' in error_msg:
-                    raise CityNotFoundError(error_msg)
-                else:
-                    raise WeatherAPIError(f"Bad request: {error_msg}")
-            elif response.status_code == 403:
-                raise APIKeyError("API key quota exceeded or access denied")
-            elif response.status_code == 429:
-                raise WeatherAPIError("Rate limit exceeded. Please try again later.")
-            elif response.status_code != 200:
-                raise WeatherAPIError(f"API request failed with status {response.status_code}")
+            # Not modified: keep the cached content and restart its TTL
+            if status == 304 and entry is not None:
+                self._cache_set(cache_key, endpoint, response, cached_content, etag, last_modified)
+                return _orjson_loads(cached_content), cached_content
             
-            return response.json()
+            # Handle different HTTP error status codes
+            error_factory = _STATUS_ERRORS.get(status)
+            if error_factory:
+                raise error_factory(response)
+            raise WeatherAPIError(f"API request failed with status {status}")
             
-        except requests.exceptions.ConnectionError:
+        except _ReqConnError:
             raise NetworkError("Unable to connect to weather service")
-        except requests.exceptions.Timeout:
+        except _ReqTimeout:
             raise NetworkError("Request timed out")
-        except requests.exceptions.RequestException as e:
+        except _ReqException as e:
             raise NetworkError(f"Network error: {str(e)}")
-        except ValueError as e:
+        except ValueError as e:  # includes orjson.JSONDecodeError
             raise WeatherAPIError(f"Invalid JSON response: {str(e)}")
     
     def get_current_weather(self, city: str) -> Dict[str, Any]:
@@ -130,26 +402,89 @@ class WeatherClient:
         Returns:
             Forecast data
         """
-        params = {
-            'q': city,
-            'days': min(days, 10),  # API limit is 10 days
-            'aqi': 'no',
-            'alerts': 'no'  # Don't include weather alerts
-        }
+        params = self._FORECAST_BASE_PARAMS.copy()
+        params['q'] = city
+        params['days'] = 10 if days > 10 else (1 if days < 1 else days)  # API accepts 1-10 days
         
         return self._make_request('forecast.json', params)
     
+    def _fan_out(self, fetch: Callable[[str], Dict[str, Any]], cities: List[str],
+                 concurrency: int) -> List[Union[Dict[str, Any], WeatherAPIError]]:
+        """
+        Run fetch for every city on a bounded thread pool
+        
+        A failed lookup is returned in place as its WeatherAPIError instead
+        of aborting the whole batch. Concurrency is clamped to at least 1
+        and capped at POOL_MAXSIZE: beyond that, extra connections would be
+        opened and thrown away rather than reused.
+        """
+        def fetch_one(city: str) -> Union[Dict[str, Any], WeatherAPIError]:
+            try:
+                return fetch(city)
+            except WeatherAPIError as e:
+                return e
+        
+        if not cities:
+            return []
+        max_workers = min(max(1, concurrency), len(cities), self.POOL_MAXSIZE)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(fetch_one, cities))
+    
+    def get_many_current(self, cities: List[str],
+                         concurrency: int = 8) -> List[Union[Dict[str, Any], WeatherAPIError]]:
+        """
+        Get current weather for several cities concurrently
+        
+        Requests run on a thread pool sharing this client's session, so N
+        cities cost roughly one round-trip instead of N serial ones.
+        
+        Args:
+            cities: City names
+            concurrency: Maximum number of requests in flight at once, to
+                stay within WeatherAPI's rate limit
+            
+        Returns:
+            Current weather data for each city, in the same order as cities;
+            a city whose lookup failed gets its WeatherAPIError instead
+        """
+        return self._fan_out(self.get_current_weather, cities, concurrency)
+    
+    def get_many_forecasts(self, cities: List[str], days: int = 5,
+                           concurrency: int = 8) -> List[Union[Dict[str, Any], WeatherAPIError]]:
+        """
+        Get weather forecasts for several cities concurrently
+        
+        Args:
+            cities: City names
+            days: Number of forecast days (1-10)
+            concurrency: Maximum number of requests in flight at once
+            
+        Returns:
+            Forecast data for each city, in the same order as cities;
+            a city whose lookup failed gets its WeatherAPIError instead
+        """
+        return self._fan_out(lambda city: self.get_forecast(city, days=days), cities, concurrency)
+    
     def test_connection(self) -> bool:
         """
         Test if the API connection is working
         
+        Sends a HEAD request instead of downloading and parsing a weather
+        payload. A 200 or 405 reply proves the host is reachable (some
+        servers refuse HEAD with 405); only a 200 additionally proves the
+        API key is accepted.
+        
         Returns:
             True if connection is working, False otherwise
         """
         try:
-            # Test with a simple request to London
-            self.get_current_weather("London")
-            return True
+            # Test with a simple request to London (URL prepared in __init__)
+            response = self.session.head(
+                self._prebuilt[self._ping_query],
+                timeout=5,
+                allow_redirects=False
+            )
+            return response.status_code in (200, 405)
         except Exception:
             return False
     